@@ -32,7 +32,7 @@ def test(config: DictConfig):
     seed(config.seed)
     model = TopographicalRNN(**config.model).to(device)
 
-    if config.model.mm_function == "torch_sparse":
+    if config.model.sparse_format == "coo_values":
         optimizer = torch.optim.SGD(
             model.parameters(),
             lr=config.optimizer.lr,
@@ -1,16 +1,24 @@
+import inspect
+import math
 import os
 import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
 from traceback import print_exc
 from typing import Optional
 
 import hydra
 import torch
+import torch._dynamo
+import torch.distributed as dist
 import yaml
 from addict import Dict as AttrDict
 from omegaconf import DictConfig, OmegaConf
 from torch import nn
+from torch.nn.parallel import DistributedDataParallel as DDP
 from torch.nn.utils import clip_grad_norm_, clip_grad_value_
 from torch.optim.lr_scheduler import OneCycleLR
+from torch.utils.data import DataLoader, DistributedSampler
 from tqdm import tqdm
 
 import wandb
@@ -26,60 +34,214 @@ from bioplnn.utils import (
 )
 
 
+def get_rank() -> int:
+    return dist.get_rank() if dist.is_initialized() else 0
+
+
+def get_world_size() -> int:
+    return dist.get_world_size() if dist.is_initialized() else 1
+
+
+def is_main_process() -> bool:
+    return get_rank() == 0
+
+
+def unwrap_model(model: nn.Module) -> nn.Module:
+    """
+    Strip the torch.compile and DistributedDataParallel wrappers from a model.
+
+    Args:
+        model (nn.Module): The (possibly wrapped) model.
+
+    Returns:
+        nn.Module: The underlying model.
+    """
+    model = getattr(model, "_orig_mod", model)
+    if isinstance(model, DDP):
+        model = model.module
+    return model
+
+
+def all_reduce_sum(values: list[float], device: torch.device) -> list[float]:
+    """
+    Sum a list of scalar statistics across all ranks.
+
+    Args:
+        values (list[float]): The local statistics.
+        device (torch.device): The device to perform the reduction on.
+
+    Returns:
+        list[float]: The statistics summed over all ranks.
+    """
+    if not dist.is_initialized():
+        return values
+    values = torch.tensor(values, dtype=torch.float64, device=device)
+    dist.all_reduce(values)
+    return values.tolist()
+
+
+def update_symlink(target: str, link_path: str) -> None:
+    """
+    Atomically point a symlink at a new target.
+
+    The new link is created under a temporary name and renamed over the old
+    one, so readers never observe a missing link.
+
+    Args:
+        target (str): The path the symlink should point to.
+        link_path (str): The path of the symlink.
+    """
+    tmp_path = f"{link_path}.{os.getpid()}.tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    os.symlink(target, tmp_path)
+    os.replace(tmp_path, link_path)
+
+
+def state_to_cpu(state):
+    """
+    Recursively copy all tensors in a (nested) state dict to the CPU.
+
+    The copy decouples the snapshot from the live parameters and optimizer
+    state, so it can be serialized while training continues.
+
+    Args:
+        state: A tensor, or a dict, list or tuple containing tensors.
+
+    Returns:
+        The same structure with every tensor copied to the CPU.
+    """
+    if isinstance(state, torch.Tensor):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return {k: state_to_cpu(v) for k, v in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(state_to_cpu(v) for v in state)
+    return state
+
+
+def save_checkpoint(checkpoint: dict, file_path: str, link_path: str) -> None:
+    """
+    Save a checkpoint and point the latest-checkpoint symlink at it.
+
+    Args:
+        checkpoint (dict): The checkpoint to save.
+        file_path (str): The path to save the checkpoint to.
+        link_path (str): The path of the latest-checkpoint symlink.
+    """
+    torch.save(checkpoint, file_path)
+    update_symlink(file_path, link_path)
+
+
+def flush_logs(log_buffer: list[tuple[int, dict]]) -> None:
+    """
+    Send buffered metrics to Weights & Biases and clear the buffer.
+
+    Every entry is logged at its own step; the last one is committed so the
+    flushed history does not wait for the next log call.
+
+    Args:
+        log_buffer (list[tuple[int, dict]]): Buffered (step, metrics) pairs.
+    """
+    for i, (step, metrics) in enumerate(log_buffer):
+        wandb.log(metrics, step=step, commit=i == len(log_buffer) - 1)
+    log_buffer.clear()
+
+
+def rebuild_dataloader(loader: DataLoader, **kwargs) -> DataLoader:
+    """
+    Rebuild a data loader, overriding some of its constructor arguments.
+
+    Args:
+        loader (DataLoader): The data loader to rebuild.
+        **kwargs: Constructor arguments to override.
+
+    Returns:
+        DataLoader: The rebuilt data loader.
+    """
+    return DataLoader(
+        **(
+            dict(
+                dataset=loader.dataset,
+                batch_size=loader.batch_size,
+                sampler=loader.sampler,
+                num_workers=loader.num_workers,
+                collate_fn=loader.collate_fn,
+                pin_memory=loader.pin_memory,
+                drop_last=loader.drop_last,
+                worker_init_fn=loader.worker_init_fn,
+                generator=loader.generator,
+                prefetch_factor=loader.prefetch_factor,
+                persistent_workers=loader.persistent_workers,
+            )
+            | kwargs
+        )
+    )
+
+
+# Maps each optimizer name to its class and a function building its constructor
+# arguments from the optimizer config
+_OPTIMIZERS = {
+    "sgd": (
+        torch.optim.SGD,
+        lambda lr, momentum, beta1, beta2: dict(lr=lr, momentum=momentum),
+    ),
+    "adam": (
+        torch.optim.Adam,
+        lambda lr, momentum, beta1, beta2: dict(lr=lr, betas=(beta1, beta2)),
+    ),
+    "adamw": (
+        torch.optim.AdamW,
+        lambda lr, momentum, beta1, beta2: dict(lr=lr, betas=(beta1, beta2)),
+    ),
+}
+
+_SCHEDULERS = {
+    "one_cycle": lambda optimizer, max_lr, total_steps: OneCycleLR(
+        optimizer, max_lr=max_lr, total_steps=total_steps
+    ),
+}
+
+_CRITERIA = {
+    "ce": lambda num_classes: torch.nn.CrossEntropyLoss(),
+    "edl": lambda num_classes: EDLLoss(num_classes=num_classes),
+}
+
+
 def initialize_optimizer(
     model_parameters, fn, lr, momentum=0.9, beta1=0.9, beta2=0.9, **kwargs
 ) -> torch.optim.Optimizer:
-    if fn == "sgd":
-        optimizer = torch.optim.SGD(
-            model_parameters,
-            lr=lr,
-            momentum=momentum,
-            **kwargs,
-        )
-    elif fn == "adam":
-        optimizer = torch.optim.Adam(
-            model_parameters,
-            lr=lr,
-            betas=(beta1, beta2),
-            **kwargs,
-        )
-    elif fn == "adamw":
-        optimizer = torch.optim.AdamW(
-            model_parameters,
-            lr=lr,
-            betas=(beta1, beta2),
-            **kwargs,
-        )
-    else:
+    if fn not in _OPTIMIZERS:
         raise NotImplementedError(f"Optimizer {fn} not implemented")
 
-    return optimizer
+    optimizer_cls, get_kwargs = _OPTIMIZERS[fn]
+
+    # Use the single-kernel CUDA implementation for optimizers that have one
+    if (
+        torch.cuda.is_available()
+        and "fused" in inspect.signature(optimizer_cls).parameters
+    ):
+        kwargs.setdefault("fused", True)
+
+    return optimizer_cls(
+        model_parameters, **(get_kwargs(lr, momentum, beta1, beta2) | kwargs)
+    )
 
 
 def initialize_scheduler(optimizer, fn, max_lr, total_steps):
     if fn is None:
-        scheduler = None
-    if fn == "one_cycle":
-        scheduler = OneCycleLR(
-            optimizer,
-            max_lr=max_lr,
-            total_steps=total_steps,
-        )
-    else:
+        return None
+    if fn not in _SCHEDULERS:
         raise NotImplementedError(f"Scheduler {fn} not implemented")
 
-    return scheduler
+    return _SCHEDULERS[fn](optimizer, max_lr, total_steps)
 
 
 def initialize_criterion(fn: str, num_classes=None) -> torch.nn.Module:
-    if fn == "ce":
-        criterion = torch.nn.CrossEntropyLoss()
-    elif fn == "edl":
-        criterion = EDLLoss(num_classes=num_classes)
-    else:
+    if fn not in _CRITERIA:
         raise NotImplementedError(f"Criterion {fn} not implemented")
 
-    return criterion
+    return _CRITERIA[fn](num_classes)
 
 
 def initialize_dataloader(config, resolution, seed):
@@ -101,9 +263,174 @@ def initialize_dataloader(config, resolution, seed):
             resolution=config.model.rnn_kwargs.in_size,
             seed=config.seed,
         )
+
+    # Shard the data across ranks when running distributed
+    if dist.is_initialized():
+        train_loader = rebuild_dataloader(
+            train_loader,
+            sampler=DistributedSampler(
+                train_loader.dataset,
+                shuffle=True,
+                seed=seed if seed is not None else 0,
+            ),
+        )
+        val_loader = rebuild_dataloader(
+            val_loader,
+            sampler=DistributedSampler(val_loader.dataset, shuffle=False),
+        )
+
+    # Keep the training batch shape static so CUDA graphs are not re-recorded
+    if not config.compile.disable:
+        train_loader = rebuild_dataloader(train_loader, drop_last=True)
+
     return train_loader, val_loader
 
 
+def batch_to_device(
+    x,
+    device: torch.device,
+    channels_last: bool = False,
+    non_blocking: bool = False,
+):
+    """
+    Move an input batch (a tensor or a list of tensors) to the device.
+
+    Args:
+        x (torch.Tensor | list[torch.Tensor]): The input batch.
+        device (torch.device): The device to move the batch to.
+        channels_last (bool, optional): Whether to convert 4D tensors to the
+            channels last memory format. Defaults to False.
+        non_blocking (bool, optional): Whether to copy asynchronously with
+            respect to the host (requires pinned memory). Defaults to False.
+
+    Returns:
+        torch.Tensor | list[torch.Tensor]: The batch on the device.
+    """
+    try:
+        if channels_last and x.dim() == 4:
+            memory_format = torch.channels_last
+        else:
+            memory_format = torch.preserve_format
+        return x.to(device, memory_format=memory_format, non_blocking=non_blocking)
+    except AttributeError:
+        return [batch_to_device(t, device, channels_last, non_blocking) for t in x]
+
+
+def autocast(config: AttrDict, device: torch.device) -> torch.autocast:
+    """
+    Build the autocast context for the forward pass and loss computation.
+
+    Args:
+        config (AttrDict): Configuration parameters.
+        device (torch.device): The device to perform computations on.
+
+    Returns:
+        torch.autocast: The autocast context manager.
+    """
+    if config.amp.dtype == "bf16":
+        dtype = torch.bfloat16
+    elif config.amp.dtype == "fp16":
+        dtype = torch.float16
+    else:
+        raise NotImplementedError(f"AMP dtype {config.amp.dtype} not implemented")
+
+    return torch.autocast(
+        device_type=device.type, dtype=dtype, enabled=config.amp.enable
+    )
+
+
+def get_mark_step(config: AttrDict):
+    """
+    Get the function that marks the start of an iteration for CUDA graphs.
+
+    Marking each iteration explicitly tells the compiled model's CUDA graphs
+    that outputs from the previous iteration may be overwritten.
+
+    Args:
+        config (AttrDict): Configuration parameters.
+
+    Returns:
+        Callable: cudagraph_mark_step_begin if compiling, otherwise a no-op.
+    """
+    if config.compile.disable:
+        return pass_fn
+    return torch.compiler.cudagraph_mark_step_begin
+
+
+def _split_outputs_all_timesteps(outputs, labels):
+    # (T, B, C) -> (T * B, C) so the loss sees a flat batch
+    return outputs.flatten(0, 1), labels.repeat(outputs.shape[0]), outputs[-1]
+
+
+def _split_outputs_last_timestep(outputs, labels):
+    return outputs, labels, outputs
+
+
+# Maps criterion.all_timesteps to a function returning (logits, targets, final
+# outputs) for a batch, selected once per epoch instead of branching every step
+_SPLIT_OUTPUTS_FNS = {
+    True: _split_outputs_all_timesteps,
+    False: _split_outputs_last_timestep,
+}
+
+
+def warmup(
+    config: AttrDict,
+    model: nn.Module,
+    optimizer: torch.optim.Optimizer,
+    train_loader: torch.utils.data.DataLoader,
+    val_loader: torch.utils.data.DataLoader,
+    device: torch.device,
+    num_iters: int = 2,
+) -> None:
+    """
+    Run the compiled model on one training and one validation batch.
+
+    This triggers graph capture and code generation for the forward and
+    backward passes before training starts. The parameters are not updated,
+    and the buffers (e.g. BatchNorm running statistics) and random number
+    generator states are restored afterwards. The batches are collated
+    directly from the datasets, so no worker processes are started and no
+    sampler epoch is consumed.
+
+    Args:
+        config (AttrDict): Configuration parameters.
+        model (nn.Module): The compiled model.
+        optimizer (torch.optim.Optimizer): The optimizer whose gradients are reset.
+        train_loader (torch.utils.data.DataLoader): The training data loader.
+        val_loader (torch.utils.data.DataLoader): The validation data loader.
+        device (torch.device): The device to perform computations on.
+        num_iters (int, optional): Number of passes per batch. Defaults to 2.
+    """
+    mark_step = get_mark_step(config)
+    buffers = {name: buffer.clone() for name, buffer in model.named_buffers()}
+    rng_devices = [device.index or 0] if device.type == "cuda" else []
+    with torch.random.fork_rng(devices=rng_devices):
+        for loader, training in ((train_loader, True), (val_loader, False)):
+            batch_size = min(loader.batch_size, len(loader.dataset))
+            x, _ = loader.collate_fn([loader.dataset[i] for i in range(batch_size)])
+            x = batch_to_device(
+                x, device, channels_last=config.channels_last, non_blocking=True
+            )
+            model.train(training)
+            for _ in range(num_iters):
+                mark_step()
+                with torch.inference_mode(not training), autocast(config, device):
+                    outputs = model(
+                        x=x,
+                        num_steps=config.train.num_steps,
+                        loss_all_timesteps=config.criterion.all_timesteps,
+                        return_activations=False,
+                    )
+                if training:
+                    outputs.float().sum().backward()
+
+    with torch.no_grad():
+        for name, buffer in model.named_buffers():
+            buffer.copy_(buffers[name])
+    optimizer.zero_grad(set_to_none=True)
+
+
 def _train(
     config: AttrDict,
     model: nn.Module,
@@ -114,6 +441,7 @@ def _train(
     epoch: int,
     global_step: int,
     device: torch.device,
+    scaler: torch.amp.GradScaler,
 ) -> tuple[float, float]:
     """
     Perform a single training iteration.
@@ -126,6 +454,8 @@ def _train(
         train_loader (torch.utils.data.DataLoader): The training data loader.
         epoch (int): The current epoch number.
         device (torch.device): The device to perform computations on.
+        scaler (torch.amp.GradScaler): The gradient scaler used for mixed
+            precision training.
 
     Returns:
         tuple[float, float]: A tuple containing the training loss and accuracy.
@@ -142,85 +472,122 @@ def _train(
         )
 
     model.train()
-    train_loss = 0.0
-    train_correct = 0
+    accum_steps = config.train.grad_accum_steps
+    # The last accumulation group is smaller when the batches don't divide evenly
+    tail_steps = len(train_loader) % accum_steps
+    num_steps = config.train.num_steps
+    all_timesteps = config.criterion.all_timesteps
+    split_outputs = _SPLIT_OUTPUTS_FNS[bool(all_timesteps)]
+    mark_step = get_mark_step(config)
+    optimizer.zero_grad(set_to_none=True)
+    # Statistics are accumulated on the device to avoid a host sync every step
+    train_loss = torch.zeros((), device=device)
+    train_correct = torch.zeros((), dtype=torch.long, device=device)
     train_total = 0
-    running_loss = 0.0
-    running_correct = 0
+    running_loss = torch.zeros((), device=device)
+    running_correct = torch.zeros((), dtype=torch.long, device=device)
     running_total = 0
+    log_buffer = []
 
     bar = tqdm(
         train_loader,
         desc=(f"Training | Epoch: {epoch} | " f"Loss: {0:.4f} | " f"Acc: {0:.2%}"),
-        disable=not config.tqdm,
+        disable=not config.tqdm or not is_main_process(),
     )
     for i, (x, labels) in enumerate(iterable=bar):
         if config.debug_forward and i == 20:
             break
-        try:
-            x = x.to(device)
-        except AttributeError:
-            x = [t.to(device) for t in x]
-        labels = labels.to(device)
-
-        # Forward pass
-        outputs = model(
-            x=x,
-            num_steps=config.train.num_steps,
-            loss_all_timesteps=config.criterion.all_timesteps,
-            return_activations=False,
+        mark_step()
+        x = batch_to_device(
+            x, device, channels_last=config.channels_last, non_blocking=True
         )
-        if config.criterion.all_timesteps:
-            logits = outputs.permute(1, 2, 0)
-            labels = labels.unsqueeze(-1).expand(-1, outputs.shape[0])
-        else:
-            logits = outputs
-
-        # Compute the loss
-        loss = criterion(logits, labels)
+        labels = labels.to(device, non_blocking=True)
+        batch_size = labels.size(0)
 
-        # Backward and optimize
-        optimizer.zero_grad()
-        loss.backward()
-        clip_grad_(model.parameters(), config.train.grad_clip.value)
-        optimizer.step()
-        if scheduler is not None:
-            scheduler.step()
+        # Only step (and all-reduce gradients) every grad_accum_steps batches
+        step = (i + 1) % accum_steps == 0 or i + 1 == len(train_loader)
+        if not step and dist.is_initialized():
+            sync_context = model.no_sync()
+        else:
+            sync_context = nullcontext()
+        if tail_steps and i >= len(train_loader) - tail_steps:
+            group_steps = tail_steps
+        else:
+            group_steps = accum_steps
+
+        with sync_context:
+            with autocast(config, device):
+                # Forward pass
+                outputs = model(
+                    x=x,
+                    num_steps=num_steps,
+                    loss_all_timesteps=all_timesteps,
+                    return_activations=False,
+                )
+                logits, targets, final_outputs = split_outputs(outputs, labels)
+
+                # Compute the loss
+                loss = criterion(logits, targets)
+
+            # Backward
+            scaler.scale(loss / group_steps).backward()
+
+        # Optimize
+        if step:
+            scaler.unscale_(optimizer)
+            clip_grad_(
+                model.parameters(),
+                config.train.grad_clip.value,
+                foreach=config.foreach,
+            )
+            scaler.step(optimizer)
+            scaler.update()
+            optimizer.zero_grad(set_to_none=True)
+            if scheduler is not None:
+                scheduler.step()
 
         # Update statistics
-        train_loss += loss.item()
-        running_loss += loss.item()
-        if config.criterion.all_timesteps:
-            predicted = outputs[-1].argmax(-1)
-        else:
-            predicted = outputs.argmax(-1)
-        correct = (predicted == labels).sum().item()
+        loss = loss.detach()
+        train_loss += loss
+        running_loss += loss
+        predicted = final_outputs.argmax(-1)
+        correct = (predicted == labels).sum()
         train_correct += correct
         running_correct += correct
-        train_total += len(labels)
-        running_total += len(labels)
+        train_total += batch_size
+        running_total += batch_size
 
         # Log statistics
         if (i + 1) % config.train.log_freq == 0:
-            running_loss /= config.train.log_freq
-            running_acc = running_correct / running_total
-            wandb.log(
-                dict(running_loss=running_loss, running_acc=running_acc),
-                step=global_step,
+            running_loss_avg = running_loss.item() / config.train.log_freq
+            running_acc = running_correct.item() / running_total
+            log_buffer.append(
+                (
+                    global_step,
+                    dict(running_loss=running_loss_avg, running_acc=running_acc),
+                )
             )
+            if len(log_buffer) >= config.train.log_flush_freq:
+                flush_logs(log_buffer)
             bar.set_description(
                 f"Training | Epoch: {epoch} | "
-                f"Loss: {running_loss:.4f} | "
+                f"Loss: {running_loss_avg:.4f} | "
                 f"Acc: {running_acc:.2%}"
             )
-            running_loss = 0
-            running_correct = 0
+            running_loss.zero_()
+            running_correct.zero_()
             running_total = 0
 
-        global_step += len(labels)
+        global_step += batch_size * get_world_size()
+
+    flush_logs(log_buffer)
 
     # Calculate average training loss and accuracy
-    train_loss /= len(train_loader)
+    train_loss, num_batches, train_correct, train_total = all_reduce_sum(
+        [train_loss.item(), len(train_loader), train_correct.item(), train_total],
+        device,
+    )
+    train_loss /= num_batches
     train_acc = train_correct / train_total
 
     return train_loss, train_acc, global_step
@@ -247,52 +614,53 @@ def _validate(
         tuple: A tuple containing the val loss and accuracy.
     """
     model.eval()
-    val_loss = 0.0
-    val_correct = 0
+    num_steps = config.train.num_steps
+    all_timesteps = config.criterion.all_timesteps
+    split_outputs = _SPLIT_OUTPUTS_FNS[bool(all_timesteps)]
+    mark_step = get_mark_step(config)
+    # Statistics are accumulated on the device to avoid a host sync every step
+    val_loss = torch.zeros((), device=device)
+    val_correct = torch.zeros((), dtype=torch.long, device=device)
     val_total = 0
 
     bar = tqdm(
         val_loader,
         desc="Validation",
-        disable=not config.tqdm,
+        disable=not config.tqdm or not is_main_process(),
     )
-    with torch.no_grad():
+    with torch.inference_mode():
         for i, (x, labels) in enumerate(bar):
             if config.debug_forward and i >= 20:
                 break
-            try:
-                x = x.to(device)
-            except AttributeError:
-                x = [t.to(device) for t in x]
-            labels = labels.to(device)
-            # Forward pass
-            outputs = model(
-                x=x,
-                num_steps=config.train.num_steps,
-                loss_all_timesteps=config.criterion.all_timesteps,
-                return_activations=False,
+            mark_step()
+            x = batch_to_device(
+                x, device, channels_last=config.channels_last, non_blocking=True
             )
-            if config.criterion.all_timesteps:
-                logits = outputs.permute(1, 2, 0)
-                labels = labels.unsqueeze(-1).expand(-1, outputs.shape[0])
-            else:
-                logits = outputs
-
-            # Compute the loss
-            loss = criterion(logits, labels)
+            labels = labels.to(device, non_blocking=True)
+            with autocast(config, device):
+                # Forward pass
+                outputs = model(
+                    x=x,
+                    num_steps=num_steps,
+                    loss_all_timesteps=all_timesteps,
+                    return_activations=False,
+                )
+                logits, targets, final_outputs = split_outputs(outputs, labels)
+
+                # Compute the loss
+                loss = criterion(logits, targets)
 
             # Update statistics
-            val_loss += loss.item()
-            if config.criterion.all_timesteps:
-                predicted = outputs[-1].argmax(-1)
-            else:
-                predicted = outputs.argmax(-1)
-            correct = (predicted == labels).sum().item()
-            val_correct += correct
+            val_loss += loss
+            predicted = final_outputs.argmax(-1)
+            val_correct += (predicted == labels).sum()
             val_total += len(labels)
 
     # Calculate average val loss and accuracy
-    val_loss /= len(val_loader)
+    val_loss, num_batches, val_correct, val_total = all_reduce_sum(
+        [val_loss.item(), len(val_loader), val_correct.item(), val_total], device
+    )
+    val_loss /= num_batches
     val_acc = val_correct / val_total
 
     return val_loss, val_acc
@@ -302,33 +670,56 @@ def train(config: DictConfig) -> None:
     """
     Train the model using the provided configuration.
 
+    For multi-GPU training, launch with
+    `torchrun --nproc_per_node=N examples/ei_trainer.py`.
+
     Args:
         config (dict): Configuration parameters.
     """
 
+    # Initialize the process group if launched with torchrun
+    if "LOCAL_RANK" in os.environ:
+        local_rank = int(os.environ["LOCAL_RANK"])
+        if torch.cuda.is_available():
+            torch.cuda.set_device(local_rank)
+            dist.init_process_group("nccl")
+        else:
+            dist.init_process_group("gloo")
+    else:
+        local_rank = None
+
     config = OmegaConf.to_container(config, resolve=True)
-    if config["debug_level"] > 0:
+    if config["debug_level"] > 0 and is_main_process():
         print(yaml.dump(config))
     config = AttrDict(config)
 
     if config.debug_level > 1:
         torch.autograd.set_detect_anomaly(True)
 
-    # Initialize Weights & Biases
+    # Initialize Weights & Biases (only the main process logs)
     wandb.require("core")
     wandb.init(
         config=config,
         settings=wandb.Settings(start_method="thread"),
-        **config.wandb,
+        **(
+            config.wandb
+            if is_main_process()
+            else without_keys(config.wandb, ["mode"]) | {"mode": "disabled"}
+        ),
     )
     global_step = 0
 
-    if config.wandb.mode != "disabled":
-        checkpoint_dir = os.path.join(config.checkpoint.root, wandb.run.name)
-    else:
-        checkpoint_dir = os.path.join(config.checkpoint.root, config.checkpoint.run)
-
-    os.makedirs(checkpoint_dir, exist_ok=True)
+    # Only the main process saves checkpoints, and only its wandb run has a
+    # real name (the other ranks run with wandb disabled)
+    checkpoint_dir = None
+    if is_main_process():
+        if config.wandb.mode != "disabled":
+            checkpoint_dir = os.path.join(config.checkpoint.root, wandb.run.name)
+        else:
+            checkpoint_dir = os.path.join(
+                config.checkpoint.root, config.checkpoint.run
+            )
+        os.makedirs(checkpoint_dir, exist_ok=True)
 
     # Set the random seed
     if config.seed is not None:
@@ -338,14 +729,38 @@ def train(config: DictConfig) -> None:
     torch.set_float32_matmul_precision(config.matmul_precision)
 
     # Get device and initialize the model
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if torch.cuda.is_available():
+        device = torch.device("cuda", local_rank or 0)
+    else:
+        device = torch.device("cpu")
     if config.data.dataset == "qclevr":
         model = QCLEVRClassifier(**config.model).to(device)
     else:
         model = ImageClassifier(**config.model).to(device)
+    if config.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    # Wrap the model for data parallel training if running distributed
+    if dist.is_initialized():
+        model = DDP(
+            model,
+            device_ids=[local_rank] if device.type == "cuda" else None,
+            gradient_as_bucket_view=True,
+            static_graph=True,
+        )
 
     # Compile the model if requested
-    model = torch.compile(model, **config.compile)
+    if not config.compile.disable:
+        torch._dynamo.config.cache_size_limit = config.compile.cache_size_limit
+    model = torch.compile(model, **without_keys(config.compile, ["cache_size_limit"]))
+
+    # Initialize the gradient scaler (only needed for fp16 mixed precision)
+    scaler = torch.amp.GradScaler(
+        "cuda",
+        enabled=config.amp.enable
+        and config.amp.dtype == "fp16"
+        and device.type == "cuda"
+    )
 
     # Initialize the optimizer
     optimizer = initialize_optimizer(model.parameters(), **config.optimizer)
@@ -365,57 +780,102 @@ def train(config: DictConfig) -> None:
         optimizer,
         fn=config.scheduler.fn,
         max_lr=config.optimizer.lr,
-        total_steps=len(train_loader) * config.train.epochs,
+        total_steps=math.ceil(len(train_loader) / config.train.grad_accum_steps)
+        * config.train.epochs,
     )
 
-    for epoch in range(config.train.epochs):
-        if config.debug_forward and epoch == 1:
-            break
-        print(f"Epoch {epoch}/{config.train.epochs}")
-        wandb.log(dict(epoch=epoch), step=global_step)
-        # Train the model
-        train_loss, train_acc, global_step = _train(
-            config,
-            model,
-            optimizer,
-            scheduler,
-            criterion,
-            train_loader,
-            epoch,
-            global_step,
-            device,
-        )
-        wandb.log(dict(train_loss=train_loss, train_acc=train_acc), step=global_step)
-
-        # Evaluate the model on the validation set
-        val_loss, val_acc = _validate(config, model, criterion, val_loader, device)
-        wandb.log(dict(test_loss=val_loss, test_acc=val_acc), step=global_step)
-
-        # Print the epoch statistics
-        print(
-            f"Epoch [{epoch}/{config.train.epochs}] | "
-            f"Train Loss: {train_loss:.4f} | "
-            f"Train Accuracy: {train_acc:.2%} | "
-            f"Test Loss: {val_loss:.4f}, "
-            f"Test Accuracy: {val_acc:.2%}"
-        )
+    # Trigger compilation up front so it is not attributed to the first epoch
+    if not config.compile.disable:
+        if is_main_process():
+            print("Warming up the compiled model")
+        warmup(config, model, optimizer, train_loader, val_loader, device)
+
+    # Save checkpoints on a background thread to overlap disk I/O with training.
+    # Leaving the block waits for a pending save, even if training raised
+    checkpoint_future: Optional[Future] = None
+    with ThreadPoolExecutor(max_workers=1) as checkpoint_executor:
+        for epoch in range(config.train.epochs):
+            if config.debug_forward and epoch == 1:
+                break
+            if isinstance(train_loader.sampler, DistributedSampler):
+                train_loader.sampler.set_epoch(epoch)
+            if is_main_process():
+                print(f"Epoch {epoch}/{config.train.epochs}")
+            wandb.log(dict(epoch=epoch), step=global_step)
+            # Train the model
+            train_loss, train_acc, global_step = _train(
+                config,
+                model,
+                optimizer,
+                scheduler,
+                criterion,
+                train_loader,
+                epoch,
+                global_step,
+                device,
+                scaler,
+            )
+            wandb.log(
+                dict(train_loss=train_loss, train_acc=train_acc), step=global_step
+            )
 
-        # Save the model
-        file_path = os.path.abspath(
-            os.path.join(checkpoint_dir, f"checkpoint_{epoch}.pt")
-        )
-        link_path = os.path.abspath(os.path.join(checkpoint_dir, "checkpoint.pt"))
-        checkpoint = {
-            "epoch": epoch,
-            "model_state_dict": getattr(model, "_orig_mod", model).state_dict(),
-            "optimizer_state_dict": optimizer.state_dict(),
-        }
-        torch.save(checkpoint, file_path)
-        try:
-            os.remove(link_path)
-        except FileNotFoundError:
-            pass
-        os.symlink(file_path, link_path)
+            # Report graph breaks once compilation has settled
+            if (
+                epoch == 0
+                and not config.compile.disable
+                and config.debug_level > 0
+                and is_main_process()
+            ):
+                print(
+                    "Graph breaks: "
+                    f"{dict(torch._dynamo.utils.counters['graph_break'])}"
+                )
+
+            # Optionally release the training activations before validation
+            # allocates its own. Emptying the cache synchronizes and discards
+            # the caching allocator's pool, so it is off by default
+            if config.train.empty_cache and device.type == "cuda":
+                torch.cuda.empty_cache()
+
+            # Evaluate the model on the validation set
+            val_loss, val_acc = _validate(config, model, criterion, val_loader, device)
+            wandb.log(dict(test_loss=val_loss, test_acc=val_acc), step=global_step)
+
+            if not is_main_process():
+                continue
+
+            # Print the epoch statistics
+            print(
+                f"Epoch [{epoch}/{config.train.epochs}] | "
+                f"Train Loss: {train_loss:.4f} | "
+                f"Train Accuracy: {train_acc:.2%} | "
+                f"Test Loss: {val_loss:.4f}, "
+                f"Test Accuracy: {val_acc:.2%}"
+            )
+
+            # Save the model
+            file_path = os.path.abspath(
+                os.path.join(checkpoint_dir, f"checkpoint_{epoch}.pt")
+            )
+            link_path = os.path.abspath(os.path.join(checkpoint_dir, "checkpoint.pt"))
+            checkpoint = state_to_cpu(
+                {
+                    "epoch": epoch,
+                    "model_state_dict": unwrap_model(model).state_dict(),
+                    "optimizer_state_dict": optimizer.state_dict(),
+                    "scaler_state_dict": scaler.state_dict(),
+                }
+            )
+            # Wait for the previous save so errors surface and at most one
+            # checkpoint is held in memory
+            if checkpoint_future is not None:
+                checkpoint_future.result()
+            checkpoint_future = checkpoint_executor.submit(
+                save_checkpoint, checkpoint, file_path, link_path
+            )
+
+    if checkpoint_future is not None:
+        checkpoint_future.result()
 
 
 @hydra.main(
@@ -434,9 +894,14 @@ def main(config: DictConfig):
         wandb.log(dict(error=str(e)))
         raise
     finally:
+        if dist.is_initialized():
+            dist.destroy_process_group()
         sys.stdout.flush()
         sys.stderr.flush()
 
 
 if __name__ == "__main__":
+    # Reduce allocator fragmentation across the train -> validation transition.
+    # This must be set before CUDA is initialized
+    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
     main()
@@ -84,8 +84,8 @@ def initialize_optimizer(
             betas=(beta1, beta2),
         )
     elif fn == "sparse_sgd":
-        if mm_function == "torch_sparse":
-            raise ValueError("sparse_sgd is not supported with torch_sparse")
+        if mm_function in ("gather_scatter", "triton"):
+            raise ValueError(f"sparse_sgd is not supported with {mm_function}")
         optimizer = SparseSGD(
             model_parameters,
             lr=lr,
@@ -166,6 +166,11 @@ def train_epoch(
             f"Gradient clipping type {config.train.grad_clip.type} not implemented"
         )
 
+    # Mark the start of each step so CUDA graph outputs can be reused
+    mark_step = (
+        pass_fn if config.compile.disable else torch.compiler.cudagraph_mark_step_begin
+    )
+
     bar = tqdm(
         train_loader,
         desc=(f"Training | Epoch: {epoch} | " f"Loss: {0:.4f} | " f"Acc: {0:.2%}"),
@@ -179,6 +184,7 @@ def train_epoch(
         labels = labels.to(device)
 
         # Forward pass
+        mark_step()
         outputs, _ = model(
             images,
             num_steps=config.train.num_steps,
@@ -266,12 +272,17 @@ def val_epoch(
     val_correct = 0
     val_total = 0
 
+    mark_step = (
+        pass_fn if config.compile.disable else torch.compiler.cudagraph_mark_step_begin
+    )
+
     with torch.no_grad():
         for images, labels in val_loader:
             images = images.to(device)
             labels = labels.to(device)
 
             # Forward pass
+            mark_step()
             outputs, _ = model(images, num_steps=config.train.num_steps)
             loss = criterion(outputs, labels)
 
@@ -330,6 +341,10 @@ def train(config: DictConfig) -> None:
         cls=config.model.cls, exclude_keys=["cls"], config=config.model
     ).to(device)
 
+    # Compile the model if requested. The time loop has a fixed shape for a
+    # given batch size, so reduce-overhead can replay it as a CUDA graph
+    model = torch.compile(model, **config.compile)
+
     optimizer = initialize_optimizer(
         model_parameters=model.parameters(),
         **config.optimizer,
@@ -378,7 +393,9 @@ def train(config: DictConfig) -> None:
                 save_dir = os.path.join(config.visualize.save_dir, wandb.run.name)
                 os.makedirs(save_dir, exist_ok=True)
                 save_path = os.path.join(save_dir, f"epoch_{epoch}")
-            _, activations = model(images, return_activations=True)
+            _, activations = model(
+                images, num_steps=config.train.num_steps, return_activations=True
+            )
             model.visualize(activations, save_path)
 
         # Print epoch statistics
@@ -89,7 +89,8 @@ class MNIST_V1(MNIST, V1Dataset):
 
     def __getitem__(self, index):
         image, target = MNIST.__getitem__(self, index)
-        v1 = self.image_to_cortex(image).flatten(1).mean(0)
+        # Sampling is linear, so average the channels first and sample only once
+        v1 = self.image_to_cortex(image.mean(0, keepdim=True)).flatten()
         return v1, target
 
 
@@ -126,7 +127,8 @@ class CIFAR10_V1(CIFAR10, V1Dataset):
 
     def __getitem__(self, index):
         image, target = CIFAR10.__getitem__(self, index)
-        v1 = self.image_to_cortex(image).flatten(1).mean(0)
+        # Sampling is linear, so average the channels first and sample only once
+        v1 = self.image_to_cortex(image.mean(0, keepdim=True)).flatten()
         return v1, target
 
 
@@ -163,7 +165,8 @@ class CIFAR100_V1(CIFAR100, V1Dataset):
 
     def __getitem__(self, index):
         image, target = CIFAR100.__getitem__(self, index)
-        v1 = self.image_to_cortex(image).flatten(1).mean(0)
+        # Sampling is linear, so average the channels first and sample only once
+        v1 = self.image_to_cortex(image.mean(0, keepdim=True)).flatten()
         return v1, target
 
 
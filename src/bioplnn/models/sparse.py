@@ -1,11 +1,41 @@
 import torch
 import torch.nn as nn
-import torch_sparse
 import torchsparsegradutils as tsgu
 
+from bioplnn.models import spmm_triton
 from bioplnn.utils import expand_list, get_activation_class
 
 
+class _GatherScatterMatMul(torch.autograd.Function):
+    """
+    Sparse (COO) @ dense product computed by gathering the input rows at the nonzeros.
+
+    Unlike the backward of torch.sparse.mm, the gradient of the values is computed
+    only at the nonzeros and never materializes the dense weight-shaped gradient.
+    """
+
+    @staticmethod
+    def forward(ctx, values, x, row_indices, col_indices, num_rows):
+        ctx.save_for_backward(values, x, row_indices, col_indices)
+        out = x.new_zeros(num_rows, x.shape[1])
+        return out.index_add_(
+            0, row_indices, x.index_select(0, col_indices) * values.unsqueeze(-1)
+        )
+
+    @staticmethod
+    def backward(ctx, grad_out):
+        values, x, row_indices, col_indices = ctx.saved_tensors
+        grad_values = grad_x = None
+        grad_rows = grad_out.index_select(0, row_indices)
+        if ctx.needs_input_grad[0]:
+            grad_values = (grad_rows * x.index_select(0, col_indices)).sum(-1)
+        if ctx.needs_input_grad[1]:
+            grad_x = torch.zeros_like(x).index_add_(
+                0, col_indices, grad_rows * values.unsqueeze(-1)
+            )
+        return grad_values, grad_x, None, None, None
+
+
 class SparseLinear(nn.Module):
     """
     Sparse linear layer for efficient operations with sparse matrices.
@@ -17,11 +47,19 @@ class SparseLinear(nn.Module):
         in_features (int): Size of the input feature dimension.
         out_features (int): Size of the output feature dimension.
         connectivity (torch.Tensor): Sparse connectivity matrix in COO format.
-        sparse_format (str, optional): Format of the sparse matrix ('torch_sparse', 'coo', or 'csr'). Defaults to "torch_sparse".
-        mm_function (str, optional): Matrix multiplication function to use ('torch_sparse', 'native', or 'tsgu'). Defaults to "torch_sparse".
+        sparse_format (str, optional): Format of the sparse matrix ('coo_values', 'coo', or 'csr'). 'coo_values' stores
+            the COO indices and values as dense tensors, so the values can be trained with dense optimizers. Defaults to "coo_values".
+        mm_function (str, optional): Matrix multiplication function to use ('gather_scatter', 'triton', 'native', or 'tsgu').
+            'gather_scatter' gathers the input at the stored indices and scatters the products into the output, so
+            gradients are only computed at the nonzeros. 'triton' uses a CSR kernel autotuned for the fixed connectivity
+            and falls back to 'gather_scatter' when Triton or CUDA is unavailable. Defaults to "gather_scatter".
         feature_dim (int, optional): Dimension on which features reside (0 for rows, 1 for columns). Defaults to -1 (unchanged).
         bias (bool, optional): If set to False, no bias term is added. Defaults to True.
         requires_grad (bool, optional): Whether the weight and bias parameters require gradient updates. Defaults to True.
+
+    Note:
+        The connectivity is coalesced (and converted to CSR if requested) once at construction. The sparsity pattern is
+        assumed fixed afterwards, so the indices must not be modified in-place.
     """
 
     def __init__(
@@ -29,8 +67,8 @@ class SparseLinear(nn.Module):
         in_features: int,
         out_features: int,
         connectivity: torch.Tensor,
-        sparse_format: str = "torch_sparse",
-        mm_function: str = "torch_sparse",
+        sparse_format: str = "coo_values",
+        mm_function: str = "gather_scatter",
         feature_dim: int = -1,
         bias: bool = True,
         requires_grad: bool = True,
@@ -58,31 +96,60 @@ class SparseLinear(nn.Module):
             )
 
         # Handle parameter initialization based on mm_function and sparse_format
-        if mm_function == "torch_sparse":
-            if sparse_format != "torch_sparse":
+        if mm_function in ("gather_scatter", "triton"):
+            if sparse_format != "coo_values":
                 raise ValueError(
-                    "mm_function must be 'torch_sparse' when sparse_format is 'torch_sparse'."
+                    "mm_function must be 'gather_scatter' or 'triton' when sparse_format is 'coo_values'."
                 )
-            indices, values = torch_sparse.coalesce(
-                connectivity.indices().clone(),
-                connectivity.values().clone(),
-                self.out_features,
-                self.in_features,
-            )
+            # Skip the sort if the connectivity is already coalesced
+            if not connectivity.is_coalesced():
+                connectivity = connectivity.coalesce()
+            indices = connectivity.indices().clone()
+            values = connectivity.values().clone()
             self.indices = nn.Parameter(indices, requires_grad=False)
             self.values = nn.Parameter(values.float(), requires_grad=requires_grad)
-        elif mm_function not in ("native", "tsgu"):
+            if mm_function == "triton":
+                for name, tensor in zip(
+                    (
+                        "crow_indices",
+                        "col_indices",
+                        "row_indices",
+                        "t_crow_indices",
+                        "t_col_indices",
+                        "t_perm",
+                    ),
+                    spmm_triton.csr_structure(
+                        indices, (self.out_features, self.in_features)
+                    ),
+                ):
+                    self.register_buffer(name, tensor)
+        elif mm_function in ("native", "tsgu"):
             if sparse_format not in ("coo", "csr"):
                 raise ValueError(
                     "mm_function must be 'native' or 'tsgu' when sparse_format is 'coo' or 'csr'."
                 )
-            weight = connectivity.clone().coalesce().float()
+            weight = connectivity.clone()
+            if not weight.is_coalesced():
+                weight = weight.coalesce()
+            weight = weight.float()
             if sparse_format == "csr":
                 weight = weight.to_sparse_csr()
+                if (
+                    mm_function == "native"
+                    and weight._nnz() <= torch.iinfo(torch.int32).max
+                ):
+                    # torch.sparse.mm accepts int32 CSR indices, halving the
+                    # index traffic
+                    weight = torch.sparse_csr_tensor(
+                        weight.crow_indices().int(),
+                        weight.col_indices().int(),
+                        weight.values(),
+                        weight.shape,
+                    )
             self.weight = nn.Parameter(weight, requires_grad=requires_grad)
         else:
             raise ValueError(
-                f"Invalid mm_function: {mm_function}. Choose from 'torch_sparse', 'native', 'tsgu'."
+                f"Invalid mm_function: {mm_function}. Choose from 'gather_scatter', 'triton', 'native', 'tsgu'."
             )
 
         self.bias = (
@@ -90,8 +157,78 @@ class SparseLinear(nn.Module):
             if bias
             else None
         )
+        self.register_buffer("quantized_values", None, persistent=False)
+
+    def quantize(self, dtype: torch.dtype = torch.bfloat16):
+        """
+        Stores a low-precision copy of the weight values that is used instead of them in eval mode.
+
+        The copy is not updated by training, so this should be called once training is done.
+
+        Args:
+            dtype (torch.dtype, optional): Data type of the copy. Defaults to torch.bfloat16.
 
-    # ... (previous code)
+        Returns:
+            SparseLinear: The layer itself.
+        """
+        if self.mm_function not in ("gather_scatter", "triton"):
+            raise NotImplementedError(
+                f"Quantization is not implemented for mm_function {self.mm_function}"
+            )
+        self.quantized_values = self.values.detach().to(dtype)
+        return self
+
+    def matmul(self, x):
+        """
+        Multiplies the sparse weight with the input tensor, without adding the bias.
+
+        Args:
+            x (torch.Tensor): Input tensor of shape (in_features, N).
+
+        Returns:
+            torch.Tensor: Output tensor of shape (out_features, N).
+        """
+        quantized = self.quantized_values is not None and not self.training
+        if quantized:
+            # Multiply in low precision and cast the result back to the input dtype
+            values = self.quantized_values
+            dtype = x.dtype
+            x = x.to(values.dtype)
+        elif self.mm_function in ("gather_scatter", "triton"):
+            values = self.values
+
+        if (
+            self.mm_function == "triton"
+            and x.is_cuda
+            and spmm_triton.is_available()
+        ):
+            x = spmm_triton.csr_mm(
+                values,
+                x,
+                self.crow_indices,
+                self.col_indices,
+                self.row_indices,
+                self.t_crow_indices,
+                self.t_col_indices,
+                self.t_perm,
+            )
+        elif self.mm_function in ("gather_scatter", "triton"):
+            x = _GatherScatterMatMul.apply(
+                values,
+                x.to(values.dtype),
+                self.indices[0],
+                self.indices[1],
+                self.out_features,
+            )
+        elif self.mm_function == "native":
+            x = torch.sparse.mm(self.weight, x)
+        elif self.mm_function == "tsgu":
+            x = tsgu.sparse_mm(self.weight, x)
+
+        if quantized:
+            x = x.to(dtype)
+
+        return x
 
     def forward(self, x):
         """
@@ -111,18 +248,7 @@ class SparseLinear(nn.Module):
             x = x.permute(*permutation)
         x = x.flatten(start_dim=1)
 
-        if self.mm_function == "torch_sparse":
-            x = torch_sparse.spmm(
-                self.indices,
-                self.values,
-                self.out_features,
-                self.in_features,
-                x,
-            )
-        elif self.mm_function == "native":
-            x = torch.sparse.mm(self.weight, x)
-        elif self.mm_function == "tsgu":
-            x = tsgu.sparse_mm(self.weight, x)
+        x = self.matmul(x)
 
         if self.bias is not None:
             x = x + self.bias
@@ -220,8 +346,8 @@ class SparseKANLayer(nn.Module):
         use_base_update (bool, optional): Whether to use a base update. Defaults to True.
         base_nonlinearity (str, optional): Nonlinearity for the base update. Defaults to "silu".
         spline_weight_init_scale (float, optional): Standard deviation for spline weight initialization. Defaults to 0.1.
-        sparse_format (str, optional): Sparse format for the connectivity matrix. Defaults to "torch_sparse".
-        mm_function (str, optional): Matrix multiplication function. Defaults to "torch_sparse".
+        sparse_format (str, optional): Sparse format for the connectivity matrix. Defaults to "coo_values".
+        mm_function (str, optional): Matrix multiplication function. Defaults to "gather_scatter".
     """
 
     def __init__(
@@ -235,8 +361,8 @@ class SparseKANLayer(nn.Module):
         use_base_update: bool = True,
         base_nonlinearity="silu",
         spline_weight_init_scale: float = 0.1,
-        sparse_format: str = "torch_sparse",
-        mm_function: str = "torch_sparse",
+        sparse_format: str = "coo_values",
+        mm_function: str = "gather_scatter",
     ) -> None:
         super().__init__()
         if (
@@ -324,8 +450,8 @@ class SparseChebyKANLayer(nn.Module):
         out_features (int): Number of output features.
         connectivity (torch.Tensor): Sparse connectivity matrix.
         degree (int): Degree of the Chebyshev polynomials.
-        sparse_format (str, optional): Sparse format for the connectivity matrix. Defaults to "torch_sparse".
-        mm_function (str, optional): Matrix multiplication function. Defaults to "torch_sparse".
+        sparse_format (str, optional): Sparse format for the connectivity matrix. Defaults to "coo_values".
+        mm_function (str, optional): Matrix multiplication function. Defaults to "gather_scatter".
     """
 
     def __init__(
@@ -334,8 +460,8 @@ class SparseChebyKANLayer(nn.Module):
         out_features: int,
         connectivity: torch.Tensor,
         degree: int,
-        sparse_format: str = "torch_sparse",
-        mm_function: str = "torch_sparse",
+        sparse_format: str = "coo_values",
+        mm_function: str = "gather_scatter",
     ) -> None:
         super().__init__()
         self.degree = degree
@@ -423,12 +549,14 @@ class SparseRNN(nn.Module):
         connectivity_ih (torch.Tensor | list[torch.Tensor]): Connectivity matrix for input-to-hidden connections.
         connectivity_hh (torch.Tensor | list[torch.Tensor]): Connectivity matrix for hidden-to-hidden connections.
         num_layers (int, optional): Number of layers. Defaults to 1.
-        sparse_format (str, optional): Sparse format. Defaults to "torch_sparse".
-        mm_function (str, optional): Matrix multiplication function. Defaults to "torch_sparse".
+        sparse_format (str, optional): Sparse format. Defaults to "coo_values".
+        mm_function (str, optional): Matrix multiplication function. Defaults to "gather_scatter".
         batch_first (bool, optional): Whether the input is in (batch_size, seq_len, input_size) format. Defaults to True.
         use_layernorm (bool, optional): Whether to use layer normalization. Defaults to True.
         nonlinearity (str, optional): Nonlinearity function. Defaults to "tanh".
         bias (bool, optional): Whether to use bias. Defaults to True.
+        fuse_epilogue (bool, optional): Whether to compile the elementwise epilogue of each step (adding the two
+            projections and the biases, then applying the nonlinearity) into a single fused kernel. Defaults to False.
     """
 
     def __init__(
@@ -438,17 +566,25 @@ class SparseRNN(nn.Module):
         connectivity_ih: torch.Tensor | list[torch.Tensor],
         connectivity_hh: torch.Tensor | list[torch.Tensor],
         num_layers: int = 1,
-        sparse_format: str = "torch_sparse",
-        mm_function: str = "torch_sparse",
+        sparse_format: str = "coo_values",
+        mm_function: str = "gather_scatter",
         batch_first: bool = True,
         use_layernorm: bool = True,
         nonlinearity: str = "tanh",
         bias: bool = True,
+        fuse_epilogue: bool = False,
     ):
         super().__init__()
 
         self.batch_first = batch_first
         self.nonlinearity = get_activation_class(nonlinearity)()
+        self.fuse_epilogue = fuse_epilogue
+        # Compiled per instance, so each one only guards on its own nonlinearity
+        self.epilogue = (
+            torch.compile(self._epilogue, fullgraph=True)
+            if fuse_epilogue
+            else self._epilogue
+        )
 
         # Expand input and hidden sizes if necessary
         self.hidden_size = expand_list(hidden_size, num_layers)
@@ -486,6 +622,17 @@ class SparseRNN(nn.Module):
             ]
         )
 
+    def _epilogue(self, ih, hh, bias_ih, bias_hh):
+        """
+        Adds the input-to-hidden and hidden-to-hidden projections and their biases, then applies the nonlinearity.
+        """
+        x = ih + hh
+        if bias_ih is not None:
+            # Both biases are summed first so the activations are only
+            # passed over once for them
+            x = x + (bias_ih + bias_hh)
+        return self.nonlinearity(x)
+
     def forward(self, x, num_steps=None):
         """
         Forward pass of the SparseRNN layer.
@@ -500,23 +647,33 @@ class SparseRNN(nn.Module):
         device = x.device
 
         # Check input dimensions and prepare for processing
+        # The input-to-hidden projection of the first layer does not depend on
+        # the hidden state, so it is computed for all steps before the loop
         if x.dim() == 2:
             if num_steps is None:
                 raise ValueError("num_steps must be provided for 2D input.")
             x = x.t()
-            x = x.unsqueeze(0).expand(num_steps, -1, -1)
+            # The input is the same at every step, so project it only once
+            x_ih = [self.layers[0].ih.matmul(x)] * num_steps
         elif x.dim() == 3:
             if self.batch_first:
-                # (batch_size, num_steps, input_size) -> (num_steps, input_size, batch_size)
-                x = x.permute(1, 2, 0)
+                # (batch_size, num_steps, input_size) -> (input_size, num_steps, batch_size)
+                x = x.permute(2, 1, 0)
             else:
-                # (num_steps, batch_size, input_size) -> (num_steps, input_size, batch_size)
-                x = x.permute(0, 2, 1)
-            if num_steps is not None and x.shape[0] != num_steps:
+                # (num_steps, batch_size, input_size) -> (input_size, num_steps, batch_size)
+                x = x.permute(2, 0, 1)
+            if num_steps is not None and x.shape[1] != num_steps:
                 raise ValueError(
                     "num_steps must be None or equal to the length of the first dimension of x"
                 )
-            num_steps = x.shape[0]
+            num_steps = x.shape[1]
+            # Project all steps with a single sparse mm instead of one per step
+            x_ih = (
+                self.layers[0]
+                .ih.matmul(x.reshape(x.shape[0], -1))
+                .view(-1, num_steps, x.shape[-1])
+                .unbind(1)
+            )
         else:
             raise ValueError(
                 f"Input tensor must be 2D or 3D, but got {x.dim()} dimensions."
@@ -528,19 +685,30 @@ class SparseRNN(nn.Module):
             torch.zeros(self.hidden_size[0], batch_size).to(device)
             for _ in range(len(self.layers))
         ]
+        # Without autograd, each step is written straight into a preallocated
+        # buffer. With autograd, stacking is cheaper than the chain of slice
+        # copies the buffer would add to the backward pass
+        stack = torch.is_grad_enabled()
         out = []
 
         # Process input sequence
         for t in range(num_steps):
             for i, layer in enumerate(self.layers):
-                h[i] = self.nonlinearity(
-                    layer.ih(x[t] if i == 0 else h[i - 1]) + layer.hh(h[i])
+                ih = layer.ih.matmul(h[i - 1]) if i > 0 else x_ih[t]
+                h[i] = self.epilogue(
+                    ih, layer.hh.matmul(h[i]), layer.ih.bias, layer.hh.bias
                 )
                 h[i] = self.layernorms[i](h[i].t()).t()
-            out.append(h[-1])
+            if stack:
+                out.append(h[-1])
+            else:
+                if t == 0:
+                    out = h[-1].new_empty(num_steps, *h[-1].shape)
+                out[t] = h[-1]
 
         # Stack outputs and adjust dimensions if necessary
-        out = torch.stack(out)
+        if stack:
+            out = torch.stack(out)
 
         if self.batch_first:
             out = out.permute(2, 0, 1)
@@ -631,6 +799,10 @@ class SparseRKANBase(nn.Module):
             torch.zeros(batch_size, self.hidden_size[0]).to(device)
             for _ in range(len(self.layers))
         ]
+        # Without autograd, each step is written straight into a preallocated
+        # buffer. With autograd, stacking is cheaper than the chain of slice
+        # copies the buffer would add to the backward pass
+        stack = torch.is_grad_enabled()
         out = []
 
         # Process input sequence
@@ -638,10 +810,16 @@ class SparseRKANBase(nn.Module):
             for i, layer in enumerate(self.layers):
                 h[i] = layer.ih(x[t] if i == 0 else h[i - 1]) + layer.hh(h[i])
                 h[i] = self.layernorms[i](h[i])
-            out.append(h[-1])
+            if stack:
+                out.append(h[-1])
+            else:
+                if t == 0:
+                    out = h[-1].new_empty(num_steps, *h[-1].shape)
+                out[t] = h[-1]
 
         # Stack outputs and adjust dimensions if necessary
-        out = torch.stack(out)
+        if stack:
+            out = torch.stack(out)
 
         if self.batch_first:
             out = out.transpose(0, 1)
@@ -661,8 +839,8 @@ class SparseRKAN(SparseRKANBase):
         connectivity_ih (torch.Tensor | list[torch.Tensor]): Connectivity matrix for input-to-hidden connections.
         connectivity_hh (torch.Tensor | list[torch.Tensor]): Connectivity matrix for hidden-to-hidden connections.
         num_layers (int, optional): Number of layers. Defaults to 1.
-        sparse_format (str, optional): Sparse format. Defaults to "torch_sparse".
-        mm_function (str, optional): Matrix multiplication function. Defaults to "torch_sparse".
+        sparse_format (str, optional): Sparse format. Defaults to "coo_values".
+        mm_function (str, optional): Matrix multiplication function. Defaults to "gather_scatter".
         batch_first (bool, optional): Whether the input is in (batch_size, seq_len, input_size) format. Defaults to True.
         grid_min (float, optional): Minimum value of the RBF grid. Defaults to -2.0.
         grid_max (float, optional): Maximum value of the RBF grid. Defaults to 2.0.
@@ -680,8 +858,8 @@ class SparseRKAN(SparseRKANBase):
         connectivity_ih: torch.Tensor | list[torch.Tensor],
         connectivity_hh: torch.Tensor | list[torch.Tensor],
         num_layers: int = 1,
-        sparse_format: str = "torch_sparse",
-        mm_function: str = "torch_sparse",
+        sparse_format: str = "coo_values",
+        mm_function: str = "gather_scatter",
         batch_first: bool = True,
         grid_min: float = -2.0,
         grid_max: float = 2.0,
@@ -745,8 +923,8 @@ class SparseRChebyKAN(SparseRKANBase):
         connectivity_hh (torch.Tensor | list[torch.Tensor]): Connectivity matrix for hidden-to-hidden connections.
         num_layers (int, optional): Number of layers. Defaults to 1.
         batch_first (bool, optional): Whether the input is in (batch_size, seq_len, input_size) format. Defaults to True.
-        sparse_format (str, optional): Sparse format. Defaults to "torch_sparse".
-        mm_function (str, optional): Matrix multiplication function. Defaults to "torch_sparse".
+        sparse_format (str, optional): Sparse format. Defaults to "coo_values".
+        mm_function (str, optional): Matrix multiplication function. Defaults to "gather_scatter".
         degree (int, optional): Degree of the Chebyshev polynomials. Defaults to 5.
         use_layernorm (bool, optional): Whether to use layer normalization. Defaults to False.
     """
@@ -759,8 +937,8 @@ class SparseRChebyKAN(SparseRKANBase):
         connectivity_hh: torch.Tensor | list[torch.Tensor],
         num_layers: int = 1,
         batch_first: bool = True,
-        sparse_format: str = "torch_sparse",
-        mm_function: str = "torch_sparse",
+        sparse_format: str = "coo_values",
+        mm_function: str = "gather_scatter",
         degree: int = 5,
         use_layernorm: bool = False,
     ):
@@ -0,0 +1,294 @@
+"""
+Triton kernels for multiplying a fixed-pattern CSR matrix with a dense matrix.
+
+The sparsity pattern of the connectivity matrices in this package never changes
+after construction, so the CSR structure (and that of its transpose, needed for
+the backward pass) is computed once by `csr_structure` and reused on every call
+to `csr_mm`. Triton is an optional dependency; use `is_available` to check for
+it before calling `csr_mm`.
+"""
+
+import torch
+
+try:
+    import triton
+    import triton.language as tl
+except ImportError:
+    triton = None
+
+
+def is_available() -> bool:
+    """
+    Whether the Triton kernels can be used.
+
+    Returns:
+        bool: True if Triton is installed and CUDA is available.
+    """
+    return triton is not None and torch.cuda.is_available()
+
+
+if triton is not None:
+
+    @triton.autotune(
+        configs=[
+            triton.Config({"BLOCK_K": 16, "BLOCK_N": 32}, num_warps=2),
+            triton.Config({"BLOCK_K": 32, "BLOCK_N": 32}, num_warps=2),
+            triton.Config({"BLOCK_K": 32, "BLOCK_N": 64}, num_warps=4),
+            triton.Config({"BLOCK_K": 64, "BLOCK_N": 64}, num_warps=4),
+            triton.Config({"BLOCK_K": 16, "BLOCK_N": 128}, num_warps=4),
+            triton.Config({"BLOCK_K": 32, "BLOCK_N": 128}, num_warps=8),
+        ],
+        key=["n_rows", "nnz", "n_cols"],
+    )
+    @triton.jit
+    def _csr_mm_kernel(
+        crow_ptr,
+        col_ptr,
+        val_ptr,
+        x_ptr,
+        y_ptr,
+        n_rows,
+        nnz,
+        n_cols,
+        stride_xk,
+        stride_xn,
+        stride_yk,
+        stride_yn,
+        BLOCK_K: tl.constexpr,
+        BLOCK_N: tl.constexpr,
+    ):
+        # Each program computes BLOCK_N columns of one output row
+        row = tl.program_id(0)
+        offs_n = tl.program_id(1) * BLOCK_N + tl.arange(0, BLOCK_N)
+        mask_n = offs_n < n_cols
+
+        start = tl.load(crow_ptr + row)
+        end = tl.load(crow_ptr + row + 1)
+
+        acc = tl.zeros((BLOCK_N,), dtype=tl.float32)
+        for k in range(start, end, BLOCK_K):
+            offs_k = k + tl.arange(0, BLOCK_K)
+            mask_k = offs_k < end
+            cols = tl.load(col_ptr + offs_k, mask=mask_k, other=0).to(tl.int64)
+            vals = tl.load(val_ptr + offs_k, mask=mask_k, other=0.0).to(tl.float32)
+            x = tl.load(
+                x_ptr + cols[:, None] * stride_xk + offs_n[None, :] * stride_xn,
+                mask=mask_k[:, None] & mask_n[None, :],
+                other=0.0,
+            ).to(tl.float32)
+            acc += tl.sum(vals[:, None] * x, axis=0)
+
+        tl.store(
+            y_ptr + row * stride_yk + offs_n * stride_yn,
+            acc.to(y_ptr.dtype.element_ty),
+            mask=mask_n,
+        )
+
+    @triton.jit
+    def _sddmm_kernel(
+        row_ptr,
+        col_ptr,
+        a_ptr,
+        b_ptr,
+        out_ptr,
+        nnz,
+        n_cols,
+        stride_ak,
+        stride_an,
+        stride_bk,
+        stride_bn,
+        BLOCK_E: tl.constexpr,
+        BLOCK_N: tl.constexpr,
+    ):
+        # Each program computes BLOCK_E entries of (a @ b.T) at the nonzeros
+        offs_e = tl.program_id(0) * BLOCK_E + tl.arange(0, BLOCK_E)
+        mask_e = offs_e < nnz
+        rows = tl.load(row_ptr + offs_e, mask=mask_e, other=0).to(tl.int64)
+        cols = tl.load(col_ptr + offs_e, mask=mask_e, other=0).to(tl.int64)
+
+        acc = tl.zeros((BLOCK_E,), dtype=tl.float32)
+        for n in range(0, n_cols, BLOCK_N):
+            offs_n = n + tl.arange(0, BLOCK_N)
+            mask = mask_e[:, None] & (offs_n < n_cols)[None, :]
+            a = tl.load(
+                a_ptr + rows[:, None] * stride_ak + offs_n[None, :] * stride_an,
+                mask=mask,
+                other=0.0,
+            ).to(tl.float32)
+            b = tl.load(
+                b_ptr + cols[:, None] * stride_bk + offs_n[None, :] * stride_bn,
+                mask=mask,
+                other=0.0,
+            ).to(tl.float32)
+            acc += tl.sum(a * b, axis=1)
+
+        tl.store(out_ptr + offs_e, acc.to(out_ptr.dtype.element_ty), mask=mask_e)
+
+
+def _csr_mm(crow_indices, col_indices, values, x, n_rows):
+    y = torch.empty(n_rows, x.shape[1], device=x.device, dtype=x.dtype)
+    grid = lambda meta: (n_rows, triton.cdiv(x.shape[1], meta["BLOCK_N"]))  # noqa: E731
+    _csr_mm_kernel[grid](
+        crow_indices,
+        col_indices,
+        values,
+        x,
+        y,
+        n_rows,
+        values.shape[0],
+        x.shape[1],
+        x.stride(0),
+        x.stride(1),
+        y.stride(0),
+        y.stride(1),
+    )
+    return y
+
+
+def _sddmm(row_indices, col_indices, a, b, dtype, block_e=64, block_n=32):
+    nnz = row_indices.shape[0]
+    out = torch.empty(nnz, device=a.device, dtype=dtype)
+    grid = (triton.cdiv(nnz, block_e),)
+    _sddmm_kernel[grid](
+        row_indices,
+        col_indices,
+        a,
+        b,
+        out,
+        nnz,
+        a.shape[1],
+        a.stride(0),
+        a.stride(1),
+        b.stride(0),
+        b.stride(1),
+        BLOCK_E=block_e,
+        BLOCK_N=block_n,
+    )
+    return out
+
+
+class _CSRMatMul(torch.autograd.Function):
+    @staticmethod
+    def forward(
+        ctx,
+        values,
+        x,
+        crow_indices,
+        col_indices,
+        row_indices,
+        t_crow_indices,
+        t_col_indices,
+        t_perm,
+    ):
+        ctx.save_for_backward(
+            values, x, col_indices, row_indices, t_crow_indices, t_col_indices, t_perm
+        )
+        return _csr_mm(crow_indices, col_indices, values, x, crow_indices.shape[0] - 1)
+
+    @staticmethod
+    def backward(ctx, grad_y):
+        (
+            values,
+            x,
+            col_indices,
+            row_indices,
+            t_crow_indices,
+            t_col_indices,
+            t_perm,
+        ) = ctx.saved_tensors
+        grad_y = grad_y.contiguous()
+        grad_values = grad_x = None
+        if ctx.needs_input_grad[0]:
+            # dL/dW is only needed at the nonzeros of W
+            grad_values = _sddmm(row_indices, col_indices, grad_y, x, values.dtype)
+        if ctx.needs_input_grad[1]:
+            # dL/dx = W^T @ dL/dy, using the precomputed CSR structure of W^T
+            grad_x = _csr_mm(
+                t_crow_indices,
+                t_col_indices,
+                values.index_select(0, t_perm),
+                grad_y,
+                x.shape[0],
+            ).to(x.dtype)
+        return grad_values, grad_x, None, None, None, None, None, None
+
+
+def csr_structure(indices: torch.Tensor, shape: tuple[int, int]):
+    """
+    Compute the CSR structure of a coalesced COO matrix and of its transpose.
+
+    The structure is stored as int32 whenever the shape and number of nonzeros allow it, which halves the index
+    traffic of the kernels compared to int64.
+
+    Args:
+        indices (torch.Tensor): Coalesced (row-major sorted) COO indices of shape (2, nnz).
+        shape (tuple[int, int]): Shape of the matrix.
+
+    Returns:
+        tuple[torch.Tensor, ...]: crow_indices, col_indices, row_indices, t_crow_indices, t_col_indices and t_perm,
+            where t_perm maps the nonzeros of the transpose (in CSR order) to those of the matrix.
+    """
+    row_indices, col_indices = indices
+    crow_indices = torch.zeros(shape[0] + 1, dtype=torch.long)
+    crow_indices[1:] = torch.bincount(row_indices, minlength=shape[0]).cumsum(0)
+
+    # The nonzeros are already sorted by row, so a stable sort by column alone
+    # yields the (column, row) order of the transpose
+    t_perm = torch.argsort(col_indices, stable=True)
+    t_crow_indices = torch.zeros(shape[1] + 1, dtype=torch.long)
+    t_crow_indices[1:] = torch.bincount(col_indices, minlength=shape[1]).cumsum(0)
+    t_col_indices = row_indices[t_perm]
+
+    index_dtype = (
+        torch.int32
+        if max(*shape, indices.shape[1]) <= torch.iinfo(torch.int32).max
+        else torch.long
+    )
+
+    return tuple(
+        tensor.to(index_dtype, copy=True)
+        for tensor in (
+            crow_indices,
+            col_indices,
+            row_indices,
+            t_crow_indices,
+            t_col_indices,
+            t_perm,
+        )
+    )
+
+
+def csr_mm(
+    values: torch.Tensor,
+    x: torch.Tensor,
+    crow_indices: torch.Tensor,
+    col_indices: torch.Tensor,
+    row_indices: torch.Tensor,
+    t_crow_indices: torch.Tensor,
+    t_col_indices: torch.Tensor,
+    t_perm: torch.Tensor,
+) -> torch.Tensor:
+    """
+    Multiply a CSR matrix with a dense matrix using Triton kernels.
+
+    Differentiable with respect to both `values` and `x`.
+
+    Args:
+        values (torch.Tensor): Nonzero values of the sparse matrix, of shape (nnz,).
+        x (torch.Tensor): Dense matrix of shape (K, N).
+        crow_indices, col_indices, row_indices, t_crow_indices, t_col_indices, t_perm (torch.Tensor):
+            The structure returned by `csr_structure`, on the same device as `x`.
+
+    Returns:
+        torch.Tensor: The result of shape (M, N).
+    """
+    return _CSRMatMul.apply(
+        values,
+        x.contiguous(),
+        crow_indices,
+        col_indices,
+        row_indices,
+        t_crow_indices,
+        t_col_indices,
+        t_perm,
+    )
@@ -7,7 +7,12 @@ import torch
 import torch.nn as nn
 from matplotlib import animation
 
-from bioplnn.models.sparse import SparseRChebyKAN, SparseRKAN, SparseRNN
+from bioplnn.models.sparse import (
+    SparseLinear,
+    SparseRChebyKAN,
+    SparseRKAN,
+    SparseRNN,
+)
 from bioplnn.utils import get_activation_class, idx_1D_to_2D, idx_2D_to_1D
 
 
@@ -67,11 +72,13 @@ class TopographicalRNNBase(nn.Module):
                 warn(
                     "Both random initialization and connectivity initialization are provided. Using connectivity initialization."
                 )
-            try:
-                self.connectivity_hh = torch.load(connectivity_hh)
-                self.connectivity_ih = torch.load(connectivity_ih)
-            except AttributeError:
-                pass
+            # The matrices may be given directly instead of as paths
+            if isinstance(connectivity_hh, str):
+                connectivity_hh = torch.load(connectivity_hh)
+            if isinstance(connectivity_ih, str):
+                connectivity_ih = torch.load(connectivity_ih)
+            self.connectivity_hh = connectivity_hh
+            self.connectivity_ih = connectivity_ih
         elif use_random:
             self.connectivity_ih, self.connectivity_hh = self.random_connectivity(
                 sheet_size, synapse_std, synapses_per_neuron, self_recurrence
@@ -87,36 +94,37 @@ class TopographicalRNNBase(nn.Module):
             or self.connectivity_hh.layout != torch.sparse_coo
         ):
             raise ValueError("Connectivity matrices must be in COO format")
-        if (
-            self.connectivity_ih.shape[0]
-            != self.connectivity_ih.shape[1]
-            != self.connectivity_hh.shape[0]
-            != self.connectivity_hh.shape[1]
-        ):
-            raise ValueError("Connectivity matrices must be square")
+        # A chained != only compares neighbours, so check that all sizes agree
+        ih_rows, ih_cols = self.connectivity_ih.shape
+        hh_rows, hh_cols = self.connectivity_hh.shape
+        if not ih_rows == ih_cols == hh_rows == hh_cols:
+            raise ValueError(
+                "Connectivity matrices must be square and of the same size"
+            )
 
         self.num_neurons = self.connectivity_ih.shape[0]
 
         # Handle input and output indices
-        if input_indices is not None:
-            try:
-                self.input_indices = torch.load(input_indices)
-            except AttributeError:
-                pass
-            if self.input_indices.dim() > 1:
-                raise ValueError("Input indices must be a 1D tensor")
-        if output_indices is not None:
-            try:
-                self.output_indices = torch.load(output_indices).squeeze()
-            except AttributeError:
-                pass
-            if self.output_indices.dim() > 1:
-                raise ValueError("Output indices must be a 1D tensor")
-
-        if (input_indices is not None and self.input_indices.dim() > 1) or (
-            output_indices is not None and self.output_indices.dim() > 1
-        ):
-            raise ValueError("Input and output indices must be 1D tensors")
+        if isinstance(input_indices, str):
+            input_indices = torch.load(input_indices)
+        if isinstance(output_indices, str):
+            output_indices = torch.load(output_indices).squeeze()
+        if input_indices is not None and input_indices.dim() > 1:
+            raise ValueError("Input indices must be a 1D tensor")
+        if output_indices is not None and output_indices.dim() > 1:
+            raise ValueError("Output indices must be a 1D tensor")
+
+        # Register the indices as buffers so they move with the model
+        self.register_buffer(
+            "input_indices",
+            input_indices.int() if input_indices is not None else None,
+            persistent=False,
+        )
+        self.register_buffer(
+            "output_indices",
+            output_indices.int() if output_indices is not None else None,
+            persistent=False,
+        )
 
         num_out_neurons = (
             self.num_neurons if output_indices is None else self.output_indices.shape[0]
@@ -129,6 +137,7 @@ class TopographicalRNNBase(nn.Module):
             nn.Linear(64, num_classes),
         )
 
+    @torch.no_grad()
     def random_connectivity(
         self, sheet_size, synapse_std, synapses_per_neuron, self_recurrence
     ):
@@ -167,41 +176,68 @@ class TopographicalRNNBase(nn.Module):
         indices = torch.stack((synapses, synapse_root)).flatten(1)
 
         # He initialization of values (synapses_per_neuron is the fan_in)
-        values_ih = torch.randn(indices.shape[1]) * math.sqrt(2 / synapses_per_neuron)
-        values_hh = torch.randn(indices.shape[1]) * math.sqrt(2 / synapses_per_neuron)
+        std = math.sqrt(2 / synapses_per_neuron)
+        values_ih = torch.empty(indices.shape[1]).normal_(0, std)
+        values_hh = torch.empty(indices.shape[1]).normal_(0, std)
 
         m = n = math.prod(sheet_size)
 
+        # Both matrices share the same indices, so coalesce (sort) them only once
+        # by carrying the two sets of values as a dense dimension. The indices are
+        # clamped to the sheet above, so the invariant checks are skipped
+        connectivity = torch.sparse_coo_tensor(
+            indices,
+            torch.stack((values_ih, values_hh), dim=-1),
+            (m, n, 2),
+            check_invariants=False,
+        ).coalesce()
+        indices = connectivity.indices()
+        values = connectivity.values()
+
         connectivity_ih = torch.sparse_coo_tensor(
             indices,
-            values_ih,
+            values[:, 0].contiguous(),
             (m, n),
-            check_invariants=True,
-        ).coalesce()
+            is_coalesced=True,
+        )
 
         connectivity_hh = torch.sparse_coo_tensor(
             indices,
-            values_hh,
+            values[:, 1].contiguous(),
             (m, n),
-            check_invariants=True,
-        ).coalesce()
+            is_coalesced=True,
+        )
 
         return connectivity_ih, connectivity_hh
 
+    def quantize(self, dtype=torch.bfloat16):
+        """
+        Quantizes the weights of all sparse layers for inference (see `SparseLinear.quantize`).
+
+        Args:
+            dtype (torch.dtype, optional): Data type of the quantized weights. Defaults to torch.bfloat16.
+
+        Returns:
+            TopographicalRNNBase: The model itself.
+        """
+        for module in self.modules():
+            if isinstance(module, SparseLinear):
+                module.quantize(dtype)
+        return self
+
     def visualize(self, activations, save_path=None, fps=4, frames=None):
         """
         Visualizes the activations of the TopographicalRNN as an animation.
 
         Args:
-            activations (torch.Tensor): Tensor of activations.
+            activations (list[torch.Tensor]): Activations at every timestep, as returned by forward with return_activations=True.
             save_path (str, optional): Path to save the animation. Defaults to None.
             fps (int, optional): Frames per second for the animation. Defaults to 4.
             frames (tuple[int, int], optional): Range of frames to visualize. Defaults to None.
         """
         if frames is not None:
             activations = activations[frames[0] : frames[1]]
-        for i in range(len(activations)):
-            activations[i] = activations[i][0].reshape(*self.sheet_size)
+        activations = [a[0].reshape(*self.sheet_size) for a in activations]
 
         # First set up the figure, the axis, and the plot element we want to animate
         fig = plt.figure(figsize=(8, 8))
@@ -239,6 +275,7 @@ class TopographicalRNNBase(nn.Module):
         x,
         num_steps=None,
         loss_all_timesteps=False,
+        return_activations=False,
     ):
         """
         Forward pass of the TopographicalRNNBase.
@@ -247,48 +284,29 @@ class TopographicalRNNBase(nn.Module):
             x (torch.Tensor): Input tensor.
             num_steps (int, optional): Number of time steps. Defaults to None.
             loss_all_timesteps (bool, optional): Whether to calculate loss for all timesteps or only the last one. Defaults to False.
+            return_activations (bool, optional): Whether to return the activations of all neurons at every timestep instead of the hidden state. Defaults to False.
 
         Returns:
-            tuple[torch.Tensor, torch.Tensor]: Output tensor and hidden state.
+            tuple[torch.Tensor, torch.Tensor | list[torch.Tensor]]: Output tensor and hidden state (or a list of num_steps CPU activations of shape (batch_size, num_neurons) if return_activations is True).
         """
         # TODO: Add sparse-dense hybrid functionality for channels
-        if self.batch_first:
-            if x.dim() == 2:
-                T = 1
-            else:
-                T = x.shape[1]
-            batch_size = x.shape[0]
-        else:
-            if x.dim() == 2:
-                T = 1
-            else:
-                T = x.shape[0]
-            batch_size = x.shape[1]
-
         if self.input_indices is not None:
-            xs = []
-            for t in range(T):
-                x_t = torch.zeros(
-                    batch_size,
-                    self.num_neurons,
-                    device=x.device,
-                    dtype=x.dtype,
-                )
-                if x.dim() == 3:
-                    if self.batch_first:
-                        x_t[:, self.input_indices] = x[:, t]
-                    else:
-                        x_t[:, self.input_indices] = x[t]
-                else:
-                    x_t[:, self.input_indices] = x
-                xs.append(x_t)
-            x = torch.stack(xs).squeeze()
+            # Scatter all timesteps into a single zero tensor, keeping the input layout
+            x_full = x.new_zeros(*x.shape[:-1], self.num_neurons)
+            x_full[..., self.input_indices] = x
+            x = x_full
 
         x, h = self.rnn(x, num_steps)
 
         if self.batch_first:
             x = x.transpose(0, 1)
 
+        # The activations stay on the device during the time loop and are
+        # copied to the host once, after it
+        activations = None
+        if return_activations:
+            activations = list(x.detach().cpu().unbind(0))
+
         # Select output indices if provided
         if self.output_indices is not None:
             x = x[..., self.output_indices]
@@ -296,7 +314,7 @@ class TopographicalRNNBase(nn.Module):
         if loss_all_timesteps:
             return [self.out_layer(out) for out in x]
 
-        return self.out_layer(x[-1]), h
+        return self.out_layer(x[-1]), activations if return_activations else h
 
 
 class TopographicalRNN(TopographicalRNNBase):
@@ -320,6 +338,7 @@ class TopographicalRNN(TopographicalRNNBase):
         rnn_nonlinearity (str, optional): Nonlinearity used in the SparseRNN. Defaults to "relu".
         use_layernorm (bool, optional): Whether to use layer normalization in the SparseRNN. Defaults to False.
         bias (bool, optional): Whether to use bias in the SparseRNN. Defaults to True.
+        fuse_epilogue (bool, optional): Whether to compile the elementwise epilogue of each SparseRNN step into a single fused kernel. Defaults to False.
     """
 
     def __init__(
@@ -331,8 +350,8 @@ class TopographicalRNN(TopographicalRNNBase):
         self_recurrence: bool = True,
         connectivity_hh: Optional[str | torch.Tensor] = None,
         connectivity_ih: Optional[str | torch.Tensor] = None,
-        sparse_format: str = "torch_sparse",
-        mm_function: str = "torch_sparse",
+        sparse_format: str = "coo_values",
+        mm_function: str = "gather_scatter",
         batch_first: bool = True,
         input_indices: Optional[str | torch.Tensor] = None,
         output_indices: Optional[str | torch.Tensor] = None,
@@ -340,6 +359,7 @@ class TopographicalRNN(TopographicalRNNBase):
         rnn_nonlinearity: str = "relu",
         use_layernorm: bool = False,
         bias: bool = True,
+        fuse_epilogue: bool = False,
     ):
         super().__init__(
             sheet_size=sheet_size,
@@ -367,6 +387,7 @@ class TopographicalRNN(TopographicalRNNBase):
             use_layernorm=use_layernorm,
             nonlinearity=rnn_nonlinearity,
             bias=bias,
+            fuse_epilogue=fuse_epilogue,
         )
 
 
@@ -389,8 +410,8 @@ class TopographicalRKAN(TopographicalRNNBase):
         use_base_update: bool = True,
         spline_weight_init_scale: float = 0.1,
         use_layernorm: bool = True,
-        sparse_format: str = "torch_sparse",
-        mm_function: str = "torch_sparse",
+        sparse_format: str = "coo_values",
+        mm_function: str = "gather_scatter",
         base_nonlinearity: str = "silu",
         out_nonlinearity: str = "relu",
     ):
@@ -442,8 +463,8 @@ class TopographicalRChebyKAN(TopographicalRNNBase):
         batch_first: bool = True,
         degree: int = 5,
         use_layernorm: bool = False,
-        sparse_format: str = "torch_sparse",
-        mm_function: str = "torch_sparse",
+        sparse_format: str = "coo_values",
+        mm_function: str = "gather_scatter",
         out_nonlinearity: str = "relu",
     ):
         super().__init__(
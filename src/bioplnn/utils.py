@@ -73,15 +73,17 @@ def get_activation_class(activation):
 
 def idx_1D_to_2D(x, m, n):
     """
-    Convert a 1D index to a 2D index.
+    Convert a 1D (row-major) index to a 2D index.
 
     Args:
         x (torch.Tensor): 1D index.
+        m (int): Number of rows.
+        n (int): Number of columns.
 
     Returns:
         torch.Tensor: 2D index.
     """
-    return torch.stack((x // m, x % n))
+    return torch.stack((x // n, x % n))
 
 
 def idx_2D_to_1D(x, m, n):
@@ -229,6 +231,8 @@ def get_qclevr_dataloaders(
         shuffle=True,
         num_workers=num_workers,
         pin_memory=torch.cuda.is_available(),
+        persistent_workers=num_workers > 0,
+        prefetch_factor=4 if num_workers > 0 else None,
         worker_init_fn=manual_seed if seed is not None else None,
         generator=torch.Generator().manual_seed(seed) if seed is not None else None,
     )
@@ -238,6 +242,8 @@ def get_qclevr_dataloaders(
         shuffle=False,
         num_workers=num_workers,
         pin_memory=torch.cuda.is_available(),
+        persistent_workers=num_workers > 0,
+        prefetch_factor=4 if num_workers > 0 else None,
         worker_init_fn=manual_seed if seed is not None else None,
         generator=torch.Generator().manual_seed(seed) if seed is not None else None,
     )
@@ -282,6 +288,8 @@ def get_cabc_dataloaders(
         shuffle=True,
         num_workers=num_workers,
         pin_memory=torch.cuda.is_available(),
+        persistent_workers=num_workers > 0,
+        prefetch_factor=4 if num_workers > 0 else None,
         worker_init_fn=manual_seed if seed is not None else None,
         generator=torch.Generator().manual_seed(seed) if seed is not None else None,
     )
@@ -291,6 +299,8 @@ def get_cabc_dataloaders(
         shuffle=False,
         num_workers=num_workers,
         pin_memory=torch.cuda.is_available(),
+        persistent_workers=num_workers > 0,
+        prefetch_factor=4 if num_workers > 0 else None,
         worker_init_fn=manual_seed if seed is not None else None,
         generator=torch.Generator().manual_seed(seed) if seed is not None else None,
     )
@@ -366,6 +376,8 @@ def _image_classification_dataloaders(
         batch_size=batch_size,
         shuffle=True,
         pin_memory=torch.cuda.is_available(),
+        persistent_workers=num_workers > 0,
+        prefetch_factor=4 if num_workers > 0 else None,
         num_workers=num_workers,
         worker_init_fn=(lambda x: manual_seed(x + seed)) if seed is not None else None,
         generator=torch.Generator().manual_seed(seed) if seed is not None else None,
@@ -376,6 +388,8 @@ def _image_classification_dataloaders(
         batch_size=batch_size,
         shuffle=False,
         pin_memory=torch.cuda.is_available(),
+        persistent_workers=num_workers > 0,
+        prefetch_factor=4 if num_workers > 0 else None,
         num_workers=num_workers,
         worker_init_fn=(lambda x: manual_seed(x + seed)) if seed is not None else None,
         generator=torch.Generator().manual_seed(seed) if seed is not None else None,
@@ -0,0 +1,106 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+import torch
+from addict import Dict as AttrDict
+from torch import nn
+from torch.utils.data import DataLoader, TensorDataset
+
+pytest.importorskip("hydra")
+pytest.importorskip("wandb")
+
+spec = importlib.util.spec_from_file_location(
+    "ei_trainer", Path(__file__).parents[1] / "examples" / "ei_trainer.py"
+)
+ei_trainer = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ei_trainer)
+
+
+def test_flush_logs_keeps_every_step(monkeypatch):
+    calls = []
+
+    def log(metrics, **kwargs):
+        calls.append((metrics, kwargs))
+
+    monkeypatch.setattr(ei_trainer.wandb, "log", log)
+    log_buffer = [
+        (0, dict(running_loss=1.0, running_acc=0.1)),
+        (64, dict(running_loss=0.5, running_acc=0.2)),
+        (128, dict(running_loss=0.25, running_acc=0.3)),
+    ]
+    expected = [
+        (metrics, dict(step=step, commit=i == len(log_buffer) - 1))
+        for i, (step, metrics) in enumerate(log_buffer)
+    ]
+
+    ei_trainer.flush_logs(log_buffer)
+
+    assert calls == expected
+    assert log_buffer == []
+
+
+class _RecordingOptimizer:
+    def __init__(self, params, lr, fused=None):
+        self.kwargs = dict(lr=lr, fused=fused)
+
+
+class _UnfusedOptimizer:
+    def __init__(self, params, lr):
+        self.kwargs = dict(lr=lr)
+
+
+@pytest.mark.parametrize(
+    "optimizer_cls, expected",
+    [
+        (_RecordingOptimizer, dict(lr=0.1, fused=True)),
+        (_UnfusedOptimizer, dict(lr=0.1)),
+    ],
+)
+def test_initialize_optimizer_defaults_to_fused(monkeypatch, optimizer_cls, expected):
+    monkeypatch.setattr(ei_trainer.torch.cuda, "is_available", lambda: True)
+    monkeypatch.setitem(
+        ei_trainer._OPTIMIZERS,
+        "recording",
+        (optimizer_cls, lambda lr, momentum, beta1, beta2: dict(lr=lr)),
+    )
+
+    optimizer = ei_trainer.initialize_optimizer([], "recording", lr=0.1)
+
+    assert optimizer.kwargs == expected
+
+
+class _BatchNormClassifier(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.norm = nn.BatchNorm1d(4)
+        self.linear = nn.Linear(4, 3)
+
+    def forward(self, x, num_steps, loss_all_timesteps, return_activations):
+        return self.linear(nn.functional.dropout(self.norm(x), training=self.training))
+
+
+def test_warmup_restores_buffers_and_rng():
+    config = AttrDict(
+        compile=dict(disable=True),
+        channels_last=False,
+        amp=dict(enable=False, dtype="bf16"),
+        train=dict(num_steps=1),
+        criterion=dict(all_timesteps=False),
+    )
+    dataset = TensorDataset(torch.randn(16, 4) * 3 + 1, torch.zeros(16))
+    train_loader = DataLoader(dataset, batch_size=8, shuffle=True)
+    val_loader = DataLoader(dataset, batch_size=8)
+    model = _BatchNormClassifier()
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    state = {k: v.clone() for k, v in model.state_dict().items()}
+    rng_state = torch.random.get_rng_state()
+
+    ei_trainer.warmup(
+        config, model, optimizer, train_loader, val_loader, torch.device("cpu")
+    )
+
+    for k, v in model.state_dict().items():
+        torch.testing.assert_close(v, state[k], rtol=0, atol=0)
+    assert all(p.grad is None for p in model.parameters())
+    assert torch.equal(torch.random.get_rng_state(), rng_state)
@@ -0,0 +1,157 @@
+import pytest
+import torch
+import torch.nn as nn
+
+from bioplnn.models import spmm_triton
+from bioplnn.models.sparse import SparseLinear, SparseRNN
+
+SHAPES = [(64, 64), (48, 96), (96, 48)]
+BATCH_SIZES = [1, 33]
+
+
+def random_connectivity(m, n, nnz, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    indices = torch.stack(
+        (
+            torch.randint(0, m, (nnz,), generator=generator),
+            torch.randint(0, n, (nnz,), generator=generator),
+        )
+    )
+    values = torch.randn(nnz, generator=generator)
+    return torch.sparse_coo_tensor(indices, values, (m, n)).coalesce()
+
+
+def assert_matches_dense(layer, connectivity, x):
+    """Compares the output and gradients of layer.matmul with a dense matmul."""
+    weight = connectivity.to_dense().to(x.device).requires_grad_(True)
+    x_ref = x.clone().requires_grad_(True)
+    x = x.clone().requires_grad_(True)
+
+    out = layer.matmul(x)
+    ref = weight @ x_ref
+    grad = torch.randn_like(ref)
+    out.backward(grad)
+    ref.backward(grad)
+
+    row_indices, col_indices = layer.indices
+    torch.testing.assert_close(out, ref, rtol=1e-4, atol=1e-4)
+    torch.testing.assert_close(x.grad, x_ref.grad, rtol=1e-4, atol=1e-4)
+    torch.testing.assert_close(
+        layer.values.grad,
+        weight.grad[row_indices, col_indices],
+        rtol=1e-4,
+        atol=1e-4,
+    )
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_gather_scatter_matches_dense(shape, batch_size):
+    connectivity = random_connectivity(*shape, nnz=shape[0] * 4)
+    layer = SparseLinear(*reversed(shape), connectivity, feature_dim=0, bias=False)
+    x = torch.randn(shape[1], batch_size)
+    assert_matches_dense(layer, connectivity, x)
+
+
+@pytest.mark.skipif(not spmm_triton.is_available(), reason="requires Triton and CUDA")
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("batch_size", BATCH_SIZES)
+def test_triton_matches_dense(shape, batch_size):
+    connectivity = random_connectivity(*shape, nnz=shape[0] * 4)
+    layer = SparseLinear(
+        *reversed(shape),
+        connectivity,
+        mm_function="triton",
+        feature_dim=0,
+        bias=False,
+    ).cuda()
+    x = torch.randn(shape[1], batch_size, device="cuda")
+    assert_matches_dense(layer, connectivity, x)
+
+
+@pytest.mark.parametrize(
+    "mm_function, device",
+    [
+        ("gather_scatter", "cpu"),
+        pytest.param(
+            "triton",
+            "cuda",
+            marks=pytest.mark.skipif(
+                not spmm_triton.is_available(), reason="requires Triton and CUDA"
+            ),
+        ),
+    ],
+)
+@pytest.mark.parametrize("shape", SHAPES)
+def test_quantized_matches_dense(mm_function, device, shape):
+    connectivity = random_connectivity(*shape, nnz=shape[0] * 4)
+    layer = SparseLinear(
+        *reversed(shape),
+        connectivity,
+        mm_function=mm_function,
+        feature_dim=0,
+        bias=False,
+    ).to(device)
+    layer.quantize()
+    x = torch.randn(shape[1], 17, device=device)
+    ref = connectivity.to_dense().to(device) @ x
+
+    with torch.no_grad():
+        out = layer.eval().matmul(x)
+        train_out = layer.train().matmul(x)
+
+    assert layer.quantized_values.dtype == torch.bfloat16
+    assert out.dtype == x.dtype
+    torch.testing.assert_close(out, ref, rtol=2e-2, atol=5e-2)
+    # The full-precision values are still used in training mode
+    torch.testing.assert_close(train_out, ref, rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("nonlinearity", ["relu", "tanh"])
+def test_fused_epilogue_matches_eager(nonlinearity):
+    connectivity_ih = random_connectivity(32, 32, nnz=128, seed=1)
+    connectivity_hh = random_connectivity(32, 32, nnz=128, seed=2)
+    rnns = [
+        SparseRNN(
+            32,
+            32,
+            connectivity_ih,
+            connectivity_hh,
+            nonlinearity=nonlinearity,
+            fuse_epilogue=fuse_epilogue,
+        )
+        for fuse_epilogue in (False, True)
+    ]
+    for rnn in rnns:
+        for layer in rnn.layers:
+            nn.init.normal_(layer.ih.bias)
+            nn.init.normal_(layer.hh.bias)
+    rnns[1].load_state_dict(rnns[0].state_dict())
+    x = torch.randn(5, 4, 32)
+
+    outs = []
+    for rnn in rnns:
+        out, _ = rnn(x)
+        out.sum().backward()
+        outs.append(out)
+
+    torch.testing.assert_close(outs[1], outs[0])
+    for eager, fused in zip(rnns[0].parameters(), rnns[1].parameters()):
+        torch.testing.assert_close(fused.grad, eager.grad)
+
+
+def test_sparse_rnn_output_buffer_matches_stack():
+    connectivity_ih = random_connectivity(32, 32, nnz=128, seed=1)
+    connectivity_hh = random_connectivity(32, 32, nnz=128, seed=2)
+    rnn = SparseRNN(32, 32, connectivity_ih, connectivity_hh)
+    x = torch.randn(5, 4, 32)
+
+    # With autograd the steps are stacked, without it they fill a buffer
+    out, h = rnn(x)
+    with torch.no_grad():
+        out_buffer, h_buffer = rnn(x)
+
+    assert out.grad_fn is not None
+    torch.testing.assert_close(out_buffer, out.detach())
+    for h_i, h_buffer_i in zip(h, h_buffer):
+        torch.testing.assert_close(h_buffer_i, h_i.detach())
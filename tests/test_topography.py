@@ -0,0 +1,127 @@
+import pytest
+import torch
+
+from bioplnn.models import TopographicalRNN
+from bioplnn.models.sparse import SparseLinear
+from bioplnn.utils import idx_1D_to_2D
+
+SHEET_SIZE = (8, 12)
+
+
+def make_model(**kwargs):
+    torch.manual_seed(0)
+    return TopographicalRNN(
+        num_classes=5,
+        sheet_size=SHEET_SIZE,
+        synapse_std=2,
+        synapses_per_neuron=6,
+        use_layernorm=True,
+        **kwargs,
+    )
+
+
+def test_quantized_matches_full_precision():
+    model = make_model().eval()
+    x = torch.rand(3, SHEET_SIZE[0] * SHEET_SIZE[1])
+    with torch.no_grad():
+        ref, _ = model(x, num_steps=4)
+        model.quantize()
+        out, _ = model(x, num_steps=4)
+
+    layers = [m for m in model.modules() if isinstance(m, SparseLinear)]
+    assert layers
+    assert all(m.quantized_values.dtype == torch.bfloat16 for m in layers)
+    torch.testing.assert_close(out, ref, rtol=5e-2, atol=5e-2)
+
+
+def test_random_connectivity_shares_coalesced_indices():
+    model = make_model()
+    connectivity_ih, connectivity_hh = model.connectivity_ih, model.connectivity_hh
+    num_neurons = SHEET_SIZE[0] * SHEET_SIZE[1]
+
+    assert connectivity_ih.shape == connectivity_hh.shape == (num_neurons,) * 2
+    assert connectivity_ih.is_coalesced() and connectivity_hh.is_coalesced()
+    assert torch.equal(connectivity_ih.indices(), connectivity_hh.indices())
+    assert not torch.equal(connectivity_ih.values(), connectivity_hh.values())
+    # With self recurrence every neuron connects to itself
+    rows, cols = connectivity_ih.indices()
+    assert torch.equal(torch.unique(cols[rows == cols]), torch.arange(num_neurons))
+
+
+def test_random_synapses_are_near_their_neuron():
+    sheet_size = (20, 40)
+    synapse_std = 2
+    model = TopographicalRNN(
+        num_classes=5,
+        sheet_size=sheet_size,
+        synapse_std=synapse_std,
+        synapses_per_neuron=16,
+        self_recurrence=False,
+    )
+
+    synapses, roots = model.connectivity_hh.indices()
+    displacement = idx_1D_to_2D(synapses, *sheet_size) - idx_1D_to_2D(
+        roots, *sheet_size
+    )
+
+    # On a non-square sheet, misplaced roots would push the synapses far away
+    assert (displacement.abs().float().mean(1) < synapse_std).all()
+
+
+def sparse_identity(n, m=None):
+    m = n if m is None else m
+    indices = torch.arange(min(n, m)).repeat(2, 1)
+    return torch.sparse_coo_tensor(indices, torch.ones(min(n, m)), (n, m))
+
+
+@pytest.mark.parametrize(
+    "ih_shape, hh_shape",
+    [((10, 20), (20, 10)), ((10, 10), (12, 12)), ((10, 10), (10, 12))],
+)
+def test_mismatched_connectivity_is_rejected(ih_shape, hh_shape):
+    with pytest.raises(ValueError, match="square and of the same size"):
+        TopographicalRNN(
+            num_classes=5,
+            synapse_std=None,
+            synapses_per_neuron=None,
+            connectivity_ih=sparse_identity(*ih_shape),
+            connectivity_hh=sparse_identity(*hh_shape),
+        )
+
+
+def test_connectivity_tensors_are_accepted():
+    model = TopographicalRNN(
+        num_classes=5,
+        synapse_std=None,
+        synapses_per_neuron=None,
+        connectivity_ih=sparse_identity(10),
+        connectivity_hh=sparse_identity(10),
+    )
+
+    assert model.num_neurons == 10
+
+
+def test_indices_are_non_persistent_buffers():
+    model = make_model(
+        input_indices=torch.arange(0, 96, 2), output_indices=torch.arange(10)
+    )
+
+    buffers = dict(model.named_buffers())
+    assert "input_indices" in buffers and "output_indices" in buffers
+    assert "input_indices" not in model.state_dict()
+    assert "output_indices" not in model.state_dict()
+
+
+def test_scattered_input_matches_full_input():
+    input_indices = torch.arange(0, 96, 3)
+    model = make_model(input_indices=input_indices).eval()
+    x = torch.rand(2, 4, input_indices.shape[0])
+    x_full = torch.zeros(2, 4, 96)
+    x_full[..., input_indices] = x
+
+    with torch.no_grad():
+        out, _ = model(x)
+        model.input_indices = None
+        ref, _ = model(x_full)
+
+    torch.testing.assert_close(out, ref)